@@ -1,5 +1,4 @@
 from pydantic_settings import BaseSettings
-from functools import lru_cache
 
 class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
@@ -16,6 +15,8 @@ class Settings(BaseSettings):
         env_file = ".env"
         case_sensitive = True
 
-@lru_cache()
+# Parsed once at import; every caller shares this instance
+settings = Settings()
+
 def get_settings():
-    return Settings() 
\ No newline at end of file
+    return settings
@@ -1,11 +1,23 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from src.ml.utils.database import create_async_rest_client
 from src.routers import scoring, features
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One REST client per running app, closed on shutdown
+    app.state.rest_client = create_async_rest_client()
+    try:
+        yield
+    finally:
+        await app.state.rest_client.aclose()
+
 app = FastAPI(
     title="Risk Classifier API",
     description="API for calculating risk scores and extracting features from proctoring data",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
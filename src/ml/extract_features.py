@@ -1,17 +1,31 @@
 import pandas as pd
 import numpy as np
-from ml.utils.database import fetch_exam_events
+from ml.utils.database import fetch_exam_events_paged
 from features.mouse_features.extractor import MouseFeatureExtractor
 from features.keyboard_features.extractor import KeyboardFeatureExtractor
 from features.window_features.extractor import WindowStateFeatureExtractor
-from features.scoring import calculate_total_score, get_risk_level
+from features.scoring import RISK_LEVELS, SCORING_FEATURES, get_risk_levels, score_feature_matrix
+from features.events import event_timestamps_ns, events_from_records, events_table_to_frame
 from datetime import timedelta
+from typing import Tuple, Union
+from joblib import Parallel, delayed, effective_n_jobs
+from collections import defaultdict
+import argparse
+import itertools
 import os
-import pytz
+import pyarrow as pa
+from zoneinfo import ZoneInfo
 
 # Create necessary directories
 os.makedirs('ml/data', exist_ok=True)
 
+# Column order of the per-window feature matrix
+FEATURE_NAMES = (
+    MouseFeatureExtractor.FEATURE_NAMES +
+    KeyboardFeatureExtractor.FEATURE_NAMES +
+    WindowStateFeatureExtractor.FEATURE_NAMES
+)
+
 def verify_risk_scores(df: pd.DataFrame) -> None:
     """Verify that risk scores are properly calculated and present"""
     expected_columns = [
@@ -38,84 +52,187 @@ def verify_risk_scores(df: pd.DataFrame) -> None:
     
     return True
 
-def process_exam_data(events: list, window_size: int = 30) -> pd.DataFrame:
+def process_exam_windows(exam_data: pd.DataFrame, exam_id: str, window_size: int) -> Tuple[np.ndarray, list]:
+    """Extract features for every non-empty time window of a single exam
+    
+    Args:
+        exam_data: Events of one exam sorted by time, with `_window_id` already assigned
+        exam_id: Exam the events belong to
+        window_size: Size of time window in seconds
+        
+    Returns:
+        Tuple of (feature matrix with one row per window in FEATURE_NAMES order, window start times)
+    """
+    print(f"Processing exam: {exam_id}")
+    
+    # Initialize feature extractors
+    mouse_extractor = MouseFeatureExtractor(window_size=window_size)
+    keyboard_extractor = KeyboardFeatureExtractor(window_size=window_size)
+    window_extractor = WindowStateFeatureExtractor(window_size=window_size)
+
+    start_time = exam_data['created_at'].iloc[0]
+    window_ids = exam_data['_window_id'].to_numpy()
+
+    # Events are sorted by time, so every window is a contiguous run of rows
+    window_bounds = np.flatnonzero(np.diff(window_ids)) + 1
+    window_first_rows = np.concatenate(([0], window_bounds))
+    window_end_rows = np.concatenate((window_bounds, [len(window_ids)]))
+
+    # Reorder once by (window, type) so every type bucket is a contiguous slice too.
+    # lexsort is stable, which keeps each bucket in time order.
+    type_codes, type_names = pd.factorize(exam_data['type'])
+    type_order = np.lexsort((type_codes, window_ids))
+    events_by_type = exam_data.iloc[type_order]
+    bucket_window_ids = window_ids[type_order]
+    bucket_type_codes = type_codes[type_order]
+    bucket_bounds = np.flatnonzero(
+        (np.diff(bucket_window_ids) != 0) | (np.diff(bucket_type_codes) != 0)
+    ) + 1
+    window_buckets = defaultdict(dict)
+    for first, end in zip(np.concatenate(([0], bucket_bounds)), np.concatenate((bucket_bounds, [len(type_order)]))):
+        if bucket_type_codes[first] < 0:  # Events without a type
+            continue
+        event_type = type_names[bucket_type_codes[first]]
+        window_buckets[bucket_window_ids[first]][event_type] = events_by_type.iloc[first:end]
+
+    # Preallocate one row per non-empty window
+    feature_values = np.empty((len(window_first_rows), len(FEATURE_NAMES)), dtype=np.float64)
+    window_starts = []
+
+    # Process each non-empty time window
+    for row, (first, end) in enumerate(zip(window_first_rows, window_end_rows)):
+        window_id = window_ids[first]
+        window_data = exam_data.iloc[first:end]
+        buckets = window_buckets[window_id]
+        current_window_start = start_time + timedelta(seconds=int(window_id) * window_size)
+
+        # Extract features
+        mouse_features = mouse_extractor.extract_features(window_data, buckets)
+        keyboard_features = keyboard_extractor.extract_features(window_data, buckets)
+        window_features = window_extractor.extract_features(window_data, buckets)
+
+        # Combine features
+        features = {**mouse_features, **keyboard_features, **window_features}
+        feature_values[row] = [features.get(name, np.nan) for name in FEATURE_NAMES]
+        window_starts.append(current_window_start)
+    
+    return feature_values, window_starts
+
+def process_exam_chunk(chunk_data: pd.DataFrame, exams: list, window_size: int) -> list:
+    """Extract features for a run of consecutive exams in one worker
+    
+    Args:
+        chunk_data: Events of the exams, sorted by exam and time
+        exams: (exam_id, first row, end row) of every exam within chunk_data
+        window_size: Size of time window in seconds
+        
+    Returns:
+        List with the process_exam_windows result of every exam, in order
+    """
+    return [
+        process_exam_windows(chunk_data.iloc[first:end], exam_id, window_size)
+        for exam_id, first, end in exams
+    ]
+
+def process_exam_data(events: Union[list, pa.Table], window_size: int = 30, n_jobs: int = -1) -> pd.DataFrame:
 
     """Process exam events and extract features
     
     Args:
-        events: List of events from database
+        events: Events from database, as a list of dicts or an Arrow table
         window_size: Size of time window in seconds
+        n_jobs: Number of worker processes for per-exam extraction (-1 uses all cores)
         
     Returns:
         DataFrame with extracted features and risk scores
     """
-    # Convert to DataFrame
-    df = pd.DataFrame(events)
+    # Convert to DataFrame, unpacking the event payloads once so extractors read plain columns per window
+    if isinstance(events, pa.Table):
+        df = events_table_to_frame(events)
+    else:
+        df = events_from_records(events)
     # Debug print
     print("\nData structure example:")
     print("Columns:", df.columns.tolist())
-    print("\nFirst row data column type:", type(df['data'].iloc[0]))
-    print("First row data content:", df['data'].iloc[0])
+    print("\nFirst row payload:", df.filter(regex='^data_').iloc[0].dropna().to_dict())
     
     # Convert timestamps to IST
-    ist = pytz.timezone('Asia/Kolkata')
+    ist = ZoneInfo('Asia/Kolkata')
     df['created_at'] = pd.to_datetime(df['created_at']).dt.tz_convert(ist)
+    # Convert once; window assignment and every extractor reuse these
+    df['_ts_ns'] = event_timestamps_ns(df)
     
-    # Initialize feature extractors
-    mouse_extractor = MouseFeatureExtractor(window_size=window_size)
-    keyboard_extractor = KeyboardFeatureExtractor(window_size=window_size)
-    window_extractor = WindowStateFeatureExtractor(window_size=window_size)
-    feature_windows = []
+    # Event types and the repeated payload labels are small closed sets, store them as category codes
+    for column in ('type', 'data_key_type', 'data_action'):
+        if column in df.columns:
+            df[column] = df[column].astype('category')
     
-    # Process each exam separately
-    for exam_id in df['exam_id'].unique():
-        if not exam_id:  # Skip if exam_id is None
-            continue
-            
-        print(f"Processing exam: {exam_id}")
-        exam_data = df[df['exam_id'] == exam_id].copy()
-        
-        # Process each time window
-        start_time = exam_data['created_at'].min()
-        end_time = exam_data['created_at'].max()
-        
-        current_window_start = start_time
-        while current_window_start < end_time:
-            current_window_end = current_window_start + timedelta(seconds=window_size)
-            
-            # Get window data
-            window_data = exam_data[
-                (exam_data['created_at'] >= current_window_start) & 
-                (exam_data['created_at'] < current_window_end)
-            ]
-            
-            if not window_data.empty:
-                # Extract features
-                mouse_features = mouse_extractor.extract_features(window_data)
-                keyboard_features = keyboard_extractor.extract_features(window_data)
-                window_features = window_extractor.extract_features(window_data)
-                
-                # Combine features
-                features = {
-                    **mouse_features,
-                    **keyboard_features,
-                    **window_features,
-                    'exam_id': exam_id,
-                    'window_start': current_window_start
-                }
-                
-                # Calculate risk scores
-                total_score, category_scores = calculate_total_score(features)
-                features.update(category_scores)
-                features['total_risk_score'] = total_score
-                features['risk_level'] = get_risk_level(total_score)
-                
-                feature_windows.append(features)
-            
-            current_window_start = current_window_end
-    
-    # Convert to DataFrame and ensure score columns exist
-    features_df = pd.DataFrame(feature_windows)
+    # Sort by exam (in order of first appearance) and time once, skipping events without an exam_id,
+    # so every exam is a contiguous block of rows
+    exam_codes, exam_names = pd.factorize(df['exam_id'])
+    has_exam = (exam_codes >= 0) & (df['exam_id'].to_numpy() != '')
+    rows = np.flatnonzero(has_exam)
+    rows = rows[np.lexsort((df['_ts_ns'].to_numpy()[rows], exam_codes[rows]))]
+    df = df.iloc[rows].reset_index(drop=True)
+    exam_codes = exam_codes[rows]
+    
+    # Assign every event to its time window, counted from the start of its exam, in a single pass
+    window_ns = window_size * 1_000_000_000
+    exam_times = df.groupby(exam_codes, sort=False)['_ts_ns']
+    exam_start_ns = exam_times.transform('min').to_numpy()
+    exam_end_ns = exam_times.transform('max').to_numpy()
+    window_ids = (df['_ts_ns'].to_numpy() - exam_start_ns) // window_ns
+    # Windows start strictly before the exam's last event, so an event exactly on the boundary
+    # at the end, and an exam whose events all share one timestamp, produce no window
+    in_window = exam_start_ns + window_ids * window_ns < exam_end_ns
+    if not in_window.all():
+        df = df[in_window].reset_index(drop=True)
+        window_ids = window_ids[in_window]
+        exam_codes = exam_codes[in_window]
+    df['_window_id'] = window_ids
+    
+    exam_first_rows = np.flatnonzero(np.diff(exam_codes, prepend=-1))
+    exam_end_rows = np.append(exam_first_rows[1:], len(df))
+    exam_ids = [exam_names[exam_codes[first]] for first in exam_first_rows]
+    
+    if len(exam_ids) <= 1:
+        exam_windows = process_exam_chunk(df, list(zip(exam_ids, exam_first_rows, exam_end_rows)), window_size)
+    else:
+        # Exams are independent, so process them in parallel: one task per worker, each
+        # getting a single slice of consecutive exams to keep pickling overhead low
+        tasks = []
+        for chunk in np.array_split(np.arange(len(exam_ids)), min(len(exam_ids), effective_n_jobs(n_jobs))):
+            chunk_first = exam_first_rows[chunk[0]]
+            chunk_end = exam_end_rows[chunk[-1]]
+            exams = [(exam_ids[i], exam_first_rows[i] - chunk_first, exam_end_rows[i] - chunk_first) for i in chunk]
+            tasks.append(delayed(process_exam_chunk)(df.iloc[chunk_first:chunk_end], exams, window_size))
+        exam_windows = list(itertools.chain.from_iterable(Parallel(n_jobs=n_jobs)(tasks)))
+    
+    # Build the features DataFrame in one shot and score all windows in one vectorized pass
+    if exam_windows:
+        feature_values = np.vstack([values for values, _ in exam_windows])
+    else:
+        feature_values = np.empty((0, len(FEATURE_NAMES)), dtype=np.float64)
+    features_df = pd.DataFrame(feature_values, columns=list(FEATURE_NAMES))
+    features_df['exam_id'] = np.repeat(exam_ids, [len(values) for values, _ in exam_windows])
+    features_df['window_start'] = list(itertools.chain.from_iterable(starts for _, starts in exam_windows))
+    feature_matrix = features_df.reindex(columns=SCORING_FEATURES, fill_value=0).to_numpy(dtype=np.float64)
+    total_scores, mouse_scores, keyboard_scores, window_scores = score_feature_matrix(feature_matrix)
+    features_df['mouse_score'] = mouse_scores
+    features_df['keyboard_score'] = keyboard_scores
+    features_df['window_score'] = window_scores
+    features_df['total_risk_score'] = total_scores
+    
+    # Features and scores are kept at full precision until here, round them once
+    float_columns = features_df.select_dtypes('float').columns
+    features_df[float_columns] = features_df[float_columns].round(4)
+    features_df['risk_level'] = pd.Categorical(
+        get_risk_levels(features_df['total_risk_score'].to_numpy()),
+        categories=RISK_LEVELS,
+        ordered=True
+    )
+    
+    # Ensure score columns exist
     score_columns = ['mouse_score', 'keyboard_score', 'window_score', 
                     'total_risk_score', 'risk_level']
     for col in score_columns:
@@ -124,10 +241,10 @@ def process_exam_data(events: list, window_size: int = 30) -> pd.DataFrame:
     
     return features_df
 
-def main():
+def main(output_format: str = 'parquet'):
     # Fetch events from database
     print("Fetching events from database...")
-    events = fetch_exam_events()
+    events = fetch_exam_events_paged()
     
     if not events:
         print("No events found in database")
@@ -144,7 +261,7 @@ def main():
         print("\nWARNING: Risk scores may not be properly calculated!")
     
     # Save features
-    output_file = 'ml/data/extracted_features-1.csv'
+    output_file = f'ml/data/extracted_features-1.{output_format}'
     
     # Ensure all score columns are present
     score_columns = ['mouse_score', 'keyboard_score', 'window_score', 
@@ -158,7 +275,16 @@ def main():
         score_columns + 
         [col for col in features_df.columns if col not in score_columns]
     )
-    features_df[column_order].to_csv(output_file, index=False)
+    if output_format == 'csv':
+        features_df[column_order].to_csv(output_file, index=False)
+    else:
+        features_df[column_order].to_parquet(
+            output_file,
+            engine='pyarrow',
+            compression='snappy',
+            index=False,
+            row_group_size=65_536
+        )
     
     print(f"\nFeatures saved to {output_file}")
     print(f"Total windows processed: {len(features_df)}")
@@ -216,4 +342,12 @@ def main():
     print(exam_summary)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Extract windowed features and risk scores from proctoring events")
+    parser.add_argument(
+        '--format',
+        choices=['parquet', 'csv'],
+        default='parquet',
+        help="Output file format (default: parquet)"
+    )
+    args = parser.parse_args()
+    main(output_format=args.format) 
\ No newline at end of file
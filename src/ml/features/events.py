@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from typing import Dict, Optional
+
+# Columns of proctoring_logs read by the feature extractors
+EVENT_COLUMNS = ('created_at', 'type', 'data', 'window_width', 'window_height')
+
+def flatten_event_data(events_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Unpack the JSON `data` payload of each event into flat `data_<key>` columns.
+
+    Run once at ingest so the feature extractors can read plain columns instead of
+    re-normalizing the payload for every window. The raw `data` dicts are dropped,
+    so they are not carried into every window slice or pickled to the workers.
+    """
+    if events_df.empty or 'data' not in events_df.columns:
+        return events_df
+
+    payloads = [data if isinstance(data, dict) else {} for data in events_df['data']]
+    data_df = pd.json_normalize(payloads).add_prefix('data_')
+    data_df.index = events_df.index
+    return pd.concat([events_df.drop(columns='data'), data_df], axis=1)
+
+def events_table_to_frame(table: pa.Table) -> pd.DataFrame:
+    """
+    Convert an Arrow table of events into a DataFrame ready for the extractors.
+
+    The `data` struct column is unpacked into `data_<key>` columns straight from the
+    Arrow buffers (same naming as flatten_event_data) and string `created_at` values
+    are parsed by Arrow, so no per-row Python work is needed. The struct column itself
+    is not converted, as pandas would rebuild it as one dict per row.
+    """
+    created_at_type = table.schema.field('created_at').type if 'created_at' in table.column_names else None
+    if created_at_type is not None and pa.types.is_string(created_at_type):
+        index = table.column_names.index('created_at')
+        table = table.set_column(index, 'created_at', table.column('created_at').cast(pa.timestamp('us', tz='UTC')))
+
+    if 'data' not in table.column_names or not pa.types.is_struct(table.schema.field('data').type):
+        return flatten_event_data(table.to_pandas())
+
+    events_df = table.drop_columns(['data']).to_pandas()
+    payload = pa.table({'data': table.column('data')})
+    while any(pa.types.is_struct(field.type) for field in payload.schema):
+        payload = payload.flatten()
+    data_df = payload.to_pandas()
+    data_df.columns = ['data_' + name[len('data.'):] for name in data_df.columns]
+    data_df.index = events_df.index
+    return pd.concat([events_df, data_df], axis=1)
+
+def events_from_records(rows: list) -> pd.DataFrame:
+    """
+    Build the extractor DataFrame from event rows as returned by Supabase.
+
+    The rows go through Arrow so the `data` payloads become a struct column that is
+    unpacked without a per-row Python pass. Payloads whose values have conflicting
+    types for the same key cannot form a struct; those fall back to flatten_event_data.
+    """
+    try:
+        table = pa.Table.from_pylist(rows)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return flatten_event_data(pd.DataFrame(rows))
+    return events_table_to_frame(table)
+
+def event_payload(events_df: pd.DataFrame, key: str) -> pd.Series:
+    """
+    Get a single payload field for every event.
+
+    Reads the flattened `data_<key>` column when available, otherwise pulls the
+    field out of the raw `data` dicts. Missing values are NaN.
+    """
+    column = f'data_{key}'
+    if column in events_df.columns:
+        return events_df[column]
+    if 'data' in events_df.columns:
+        values = [data.get(key, np.nan) if isinstance(data, dict) else np.nan for data in events_df['data']]
+        return pd.Series(values, index=events_df.index, dtype=object)
+    return pd.Series(np.nan, index=events_df.index, dtype=object)
+
+def event_timestamps_ns(events_df: pd.DataFrame) -> np.ndarray:
+    """
+    Get event timestamps as int64 nanoseconds since the epoch (UTC).
+
+    Uses the precomputed `_ts_ns` column when the caller added one at ingest,
+    otherwise parses `created_at` only when it is not already a datetime column.
+    """
+    if '_ts_ns' in events_df.columns:
+        return events_df['_ts_ns'].to_numpy()
+    created_at = events_df['created_at']
+    if not pd.api.types.is_datetime64_any_dtype(created_at):
+        created_at = pd.to_datetime(created_at)
+    return created_at.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+def ingest_events(rows: list) -> pd.DataFrame:
+    """
+    Build the event frame the API endpoints hand to the extractors.
+
+    Unpacks payloads into data_<key> columns, converts `created_at` to UTC, stores
+    `type` as a category (a small closed set, compared as codes), sorts by time and
+    adds the int64 nanosecond `_ts_ns` column every extractor reuses.
+    """
+    events = events_from_records(rows)
+    events['created_at'] = pd.to_datetime(events['created_at']).dt.tz_convert('UTC')
+    events['type'] = events['type'].astype('category')
+    events = events.sort_values('created_at', kind='mergesort', ignore_index=True)
+    events['_ts_ns'] = event_timestamps_ns(events)
+    return events
+
+def bucket_events(events_df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """
+    Split events by type once, as {event type: events}.
+
+    Pass the result as `buckets` to every extractor so none of them filters the
+    full frame again.
+    """
+    return {
+        event_type: group
+        for event_type, group in events_df.groupby('type', sort=False, observed=True)
+    }
+
+def select_events(events_df: pd.DataFrame, event_type: str,
+                  buckets: Optional[Dict[str, pd.DataFrame]] = None) -> pd.DataFrame:
+    """
+    Get the events of a single type.
+
+    When `buckets` ({event type: events}) is given the window has already been split
+    by type once for all extractors, so no filtering is needed here.
+    """
+    if buckets is not None:
+        bucket = buckets.get(event_type)
+        return bucket if bucket is not None else events_df.iloc[:0]
+    return events_df[events_df['type'].values == event_type]
@@ -0,0 +1,29 @@
+import numpy as np
+
+def seconds_to_ns(seconds: float) -> int:
+    """Convert a threshold in seconds to integer nanoseconds."""
+    return int(round(seconds * 1_000_000_000))
+
+def count_rapid_gaps(sorted_ns: np.ndarray, threshold_ns: int) -> int:
+    """
+    Count consecutive events that are at most `threshold_ns` apart.
+
+    Works on int64 nanosecond timestamps sorted ascending, so the gaps are compared
+    as integers without converting to seconds.
+    """
+    if len(sorted_ns) < 2:
+        return 0
+    return int(np.count_nonzero(np.diff(sorted_ns) <= threshold_ns))
+
+def blur_durations(blur_ns: np.ndarray, focus_ns: np.ndarray) -> np.ndarray:
+    """
+    Get the duration (seconds) from every blur to the first focus strictly after it.
+
+    Both inputs are int64 nanosecond timestamps sorted ascending. Blurs with no later
+    focus are left out.
+    """
+    if len(blur_ns) == 0 or len(focus_ns) == 0:
+        return np.empty(0, dtype=np.float64)
+    next_focus = np.searchsorted(focus_ns, blur_ns, side='right')
+    has_focus = next_focus < len(focus_ns)
+    return (focus_ns[next_focus[has_focus]] - blur_ns[has_focus]) / 1e9
@@ -1,9 +1,21 @@
-import uvicorn
+import sys
 import numpy as np
 import pandas as pd
-from typing import Dict, Set
+from typing import Dict, Optional, Set
+
+from ..events import event_payload, event_timestamps_ns, select_events
+from ..kernels import count_rapid_gaps, seconds_to_ns
 
 class KeyboardFeatureExtractor:
+    # Names of the features returned by extract_features, in a fixed order
+    FEATURE_NAMES = (
+        'key_press_rate', 'key_press_count', 'shortcut_key_ratio', 'shortcut_key_count',
+        'alt_key_count', 'tab_key_count', 'meta_key_count', 'control_key_count', 'shift_key_count',
+        'backspace_ratio', 'backspace_count', 'backspace_burst_count', 'rapid_key_ratio', 'rapid_key_count',
+        'clipboard_operation_rate', 'clipboard_operation_count', 'copy_count', 'cut_count', 'paste_count',
+        'avg_clipboard_length'
+    )
+
     def __init__(self,
                  window_size: int = 30,
                  shortcut_keys: Set[str] = {'Control', 'Alt', 'Tab', 'Meta', 'Shift'},
@@ -19,11 +31,13 @@ class KeyboardFeatureExtractor:
             backspace_burst_threshold: Time threshold (in seconds) for backspace burst detection
         """
         self.window_size = window_size
-        self.shortcut_keys = shortcut_keys
+        self.shortcut_keys = frozenset(sys.intern(key) for key in shortcut_keys)
+        self.backspace_keys = np.array(['Backspace', 'Delete'], dtype=object)
         self.rapid_key_threshold = rapid_key_threshold
         self.backspace_burst_threshold = backspace_burst_threshold
         
-    def extract_features(self, events_df: pd.DataFrame) -> Dict[str, float]:
+    def extract_features(self, events_df: pd.DataFrame,
+                         buckets: Optional[Dict[str, pd.DataFrame]] = None) -> Dict[str, float]:
         """
         Extract keyboard and clipboard-related features from event data.
         
@@ -47,11 +61,13 @@ class KeyboardFeatureExtractor:
         - copy_count: Number of copy operations
         - cut_count: Number of cut operations
         - paste_count: Number of paste operations
-        - avg_clipboard_length: Average length of clipboard content
+        - avg_clipboard_length: Average length of copied/cut content (logged selection lengths)
+        
+        `buckets` optionally holds the window's events already split by type.
         """
         features = {}
-        timestamps = pd.to_datetime(events_df['created_at'])
-        total_time = (timestamps.max() - timestamps.min()).total_seconds() if len(timestamps) > 0 else 0
+        timestamps_ns = event_timestamps_ns(events_df)
+        total_time = (timestamps_ns.max() - timestamps_ns.min()) / 1e9 if len(timestamps_ns) > 0 else 0
         
         if total_time == 0:
             return {
@@ -78,43 +94,49 @@ class KeyboardFeatureExtractor:
             }
 
         # Process keyboard events
-        key_events = events_df[events_df['type'] == 'key_press'].copy()
-        if len(key_events) > 0:
-            key_types = pd.json_normalize(key_events['data'])['key_type']
-            key_timestamps = pd.to_datetime(key_events['created_at'])
-            time_diffs = key_timestamps.diff().dt.total_seconds()
+        key_events = select_events(events_df, 'key_press', buckets)
+        n_keys = len(key_events)
+        if n_keys > 0:
+            inv_n = 1.0 / n_keys
+            key_values = event_payload(key_events, 'key_type').to_numpy()
+            # Nanoseconds between each keystroke and the previous one
+            key_timestamps_ns = event_timestamps_ns(key_events)
+            key_gaps_ns = np.diff(key_timestamps_ns)
             
             # Basic keyboard metrics
-            features['key_press_count'] = round(float(len(key_events)), 4)
-            features['key_press_rate'] = round(features['key_press_count'] / total_time, 4)
+            features['key_press_count'] = float(n_keys)
+            features['key_press_rate'] = features['key_press_count'] / total_time
+            
+            # Count every key type in a single pass
+            key_counts = dict(zip(*(part.tolist() for part in np.unique(key_values.astype(str), return_counts=True))))
             
             # Individual suspicious key counts
-            features['alt_key_count'] = round(float(sum(key_types == 'Alt')), 4)
-            features['tab_key_count'] = round(float(sum(key_types == 'Tab')), 4)
-            features['meta_key_count'] = round(float(sum(key_types == 'Meta')), 4)
-            features['control_key_count'] = round(float(sum(key_types == 'Control')), 4)
-            features['shift_key_count'] = round(float(sum(key_types == 'Shift')), 4)
+            features['alt_key_count'] = float(key_counts.get('Alt', 0))
+            features['tab_key_count'] = float(key_counts.get('Tab', 0))
+            features['meta_key_count'] = float(key_counts.get('Meta', 0))
+            features['control_key_count'] = float(key_counts.get('Control', 0))
+            features['shift_key_count'] = float(key_counts.get('Shift', 0))
             
             # Shortcut key patterns (keeping ratio for overall picture)
-            shortcut_count = sum(1 for key in key_types if key in self.shortcut_keys)
-            features['shortcut_key_count'] = round(float(shortcut_count), 4)
-            features['shortcut_key_ratio'] = round(shortcut_count / len(key_events), 4)
+            shortcut_count = int(sum(key_counts.get(key, 0) for key in self.shortcut_keys))
+            features['shortcut_key_count'] = float(shortcut_count)
+            features['shortcut_key_ratio'] = shortcut_count * inv_n
             
             # Backspace patterns
-            backspace_count = sum(1 for key in key_types if key in ['Backspace', 'Delete'])
-            features['backspace_count'] = round(float(backspace_count), 4)
-            features['backspace_ratio'] = round(backspace_count / len(key_events), 4)
+            backspace_count = int(sum(key_counts.get(key, 0) for key in self.backspace_keys))
+            features['backspace_count'] = float(backspace_count)
+            features['backspace_ratio'] = backspace_count * inv_n
             
-            # Backspace bursts
-            backspace_bursts = sum(1 for i in range(len(key_types)) 
-                if key_types.iloc[i] in ['Backspace', 'Delete'] and 
-                i > 0 and time_diffs.iloc[i] <= self.backspace_burst_threshold)
-            features['backspace_burst_count'] = round(float(backspace_bursts), 4)
+            # Backspace bursts (a backspace/delete shortly after the previous keystroke)
+            is_backspace = np.isin(key_values, self.backspace_keys)
+            backspace_bursts = int(np.count_nonzero(
+                is_backspace[1:] & (key_gaps_ns <= seconds_to_ns(self.backspace_burst_threshold))))
+            features['backspace_burst_count'] = float(backspace_bursts)
             
             # Rapid typing patterns
-            rapid_keystrokes = sum(1 for t in time_diffs if t <= self.rapid_key_threshold)
-            features['rapid_key_count'] = round(float(rapid_keystrokes), 4)
-            features['rapid_key_ratio'] = round(rapid_keystrokes / len(key_events), 4)
+            rapid_keystrokes = count_rapid_gaps(key_timestamps_ns, seconds_to_ns(self.rapid_key_threshold))
+            features['rapid_key_count'] = float(rapid_keystrokes)
+            features['rapid_key_ratio'] = rapid_keystrokes * inv_n
         else:
             features.update({
                 'key_press_rate': 0.0000,
@@ -134,22 +156,27 @@ class KeyboardFeatureExtractor:
             })
 
         # Process clipboard events
-        clipboard_events = events_df[events_df['type'] == 'clipboard'].copy()
+        clipboard_events = select_events(events_df, 'clipboard', buckets)
         if len(clipboard_events) > 0:
-            clipboard_data = pd.json_normalize(clipboard_events['data'])
+            clipboard_actions = event_payload(clipboard_events, 'action').to_numpy()
             
             # Calculate clipboard operation counts and rate
-            features['clipboard_operation_count'] = round(float(len(clipboard_events)), 4)
-            features['clipboard_operation_rate'] = round((features['clipboard_operation_count'] * 60) / total_time, 4)
+            features['clipboard_operation_count'] = float(len(clipboard_events))
+            features['clipboard_operation_rate'] = (features['clipboard_operation_count'] * 60) / total_time
             
             # Calculate counts for each operation type
-            features['copy_count'] = round(float(sum(clipboard_data['action'] == 'copy')), 4)
-            features['cut_count'] = round(float(sum(clipboard_data['action'] == 'cut')), 4)
-            features['paste_count'] = round(float(sum(clipboard_data['action'] == 'paste')), 4)
+            features['copy_count'] = float(np.count_nonzero(clipboard_actions == 'copy'))
+            features['cut_count'] = float(np.count_nonzero(clipboard_actions == 'cut'))
+            features['paste_count'] = float(np.count_nonzero(clipboard_actions == 'paste'))
             
-            # Calculate average selection length
-            selection_lengths = clipboard_data['selection'].astype(str).str.len()
-            features['avg_clipboard_length'] = round(selection_lengths.mean(), 4)
+            # Calculate average selection length. The client logs the selection's length as a
+            # number; text selections are measured. Events without a selection (paste) are skipped.
+            selection_lengths = [
+                float(selection) if isinstance(selection, (int, float, np.number)) else float(len(str(selection)))
+                for selection in event_payload(clipboard_events, 'selection')
+                if not isinstance(selection, bool) and pd.notna(selection)
+            ]
+            features['avg_clipboard_length'] = float(np.mean(selection_lengths)) if selection_lengths else 0.0
         else:
             features.update({
                 'clipboard_operation_rate': 0.0000,
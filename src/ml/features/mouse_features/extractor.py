@@ -1,9 +1,16 @@
-import uvicorn
 import numpy as np
 import pandas as pd
-from typing import Dict
+from typing import Dict, Optional
+
+from ..events import event_payload, event_timestamps_ns, select_events
 
 class MouseFeatureExtractor:
+    # Names of the features returned by extract_features, in a fixed order
+    FEATURE_NAMES = (
+        'avg_norm_x', 'avg_norm_y', 'std_norm_x', 'std_norm_y',
+        'top_edge_time', 'bottom_edge_time', 'idle_percentage'
+    )
+
     def __init__(self, 
                  window_size: int = 30,
                  edge_threshold: float = 0.05,  # top/bottom 5% of screen
@@ -20,7 +27,8 @@ class MouseFeatureExtractor:
         self.edge_threshold = edge_threshold
         self.idle_threshold = idle_threshold
 
-    def extract_features(self, events_df: pd.DataFrame) -> Dict[str, float]:
+    def extract_features(self, events_df: pd.DataFrame,
+                         buckets: Optional[Dict[str, pd.DataFrame]] = None) -> Dict[str, float]:
         """
         Extract features from mouse movement data.
         
@@ -30,9 +38,11 @@ class MouseFeatureExtractor:
         - top_edge_time: Fraction of time spent in top edge_threshold of screen
         - bottom_edge_time: Fraction of time spent in bottom edge_threshold of screen
         - idle_percentage: Fraction of time with no movement (>idle_threshold seconds)
+        
+        `buckets` optionally holds the window's events already split by type.
         """
         # Filter mouse events
-        mouse_events = events_df[events_df['type'] == 'mouse_move'].copy()
+        mouse_events = select_events(events_df, 'mouse_move', buckets)
         
         if len(mouse_events) < 1:
             return {
@@ -46,36 +56,35 @@ class MouseFeatureExtractor:
             }
         
         # Extract coordinates and normalize
-        coords = pd.json_normalize(mouse_events['data'])
         window_width = mouse_events['window_width'].iloc[0]
         window_height = mouse_events['window_height'].iloc[0]
         
         # Convert coordinates to float and normalize
-        norm_x = coords['x'].astype(float) / window_width
-        norm_y = coords['y'].astype(float) / window_height
+        norm_x = event_payload(mouse_events, 'x').to_numpy(dtype=np.float64) / window_width
+        norm_y = event_payload(mouse_events, 'y').to_numpy(dtype=np.float64) / window_height
         
-        # Calculate basic position features
-        avg_norm_y = norm_y.mean()
+        # Calculate basic position features (sample std, NaN-skipping like pandas)
+        avg_norm_y = float(np.nanmean(norm_y))
         features = {
-            'avg_norm_x': round(norm_x.mean(), 4),
-            'avg_norm_y': round(avg_norm_y, 4),
-            'std_norm_x': round(norm_x.std() if len(norm_x) > 1 else 0.0, 4),
-            'std_norm_y': round(norm_y.std() if len(norm_y) > 1 else 0.0, 4)
+            'avg_norm_x': float(np.nanmean(norm_x)),
+            'avg_norm_y': avg_norm_y,
+            'std_norm_x': float(np.nanstd(norm_x, ddof=1)) if len(norm_x) > 1 else 0.0,
+            'std_norm_y': float(np.nanstd(norm_y, ddof=1)) if len(norm_y) > 1 else 0.0
         }
         
         # Simple edge detection based on average position
-        features['top_edge_time'] = round(1.0 if avg_norm_y <= self.edge_threshold else 0.0, 4)
-        features['bottom_edge_time'] = round(1.0 if avg_norm_y >= (1 - self.edge_threshold) else 0.0, 4)
+        features['top_edge_time'] = 1.0 if avg_norm_y <= self.edge_threshold else 0.0
+        features['bottom_edge_time'] = 1.0 if avg_norm_y >= (1 - self.edge_threshold) else 0.0
         
         # Calculate idle time using timestamps
-        timestamps = pd.to_datetime(mouse_events['created_at'])
-        time_diffs = timestamps.diff().dt.total_seconds()
-        total_time = (timestamps.max() - timestamps.min()).total_seconds()
+        timestamps_ns = event_timestamps_ns(mouse_events)
+        time_diffs = np.diff(timestamps_ns) / 1e9
+        total_time = (timestamps_ns.max() - timestamps_ns.min()) / 1e9
         
         if total_time > 0:
             # Calculate idle time
             idle_times = time_diffs[time_diffs > self.idle_threshold]
-            features['idle_percentage'] = round(idle_times.sum() / total_time, 4)
+            features['idle_percentage'] = idle_times.sum() / total_time
         else:
             features['idle_percentage'] = 1.0000
             
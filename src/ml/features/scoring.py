@@ -1,6 +1,17 @@
-import uvicorn
 import numpy as np
-from typing import Dict, Tuple
+from typing import Dict, Sequence, Tuple
+
+# Features used for scoring, in the order expected by score_feature_vector
+SCORING_FEATURES = (
+    # Mouse
+    'top_edge_time', 'bottom_edge_time', 'std_norm_x', 'std_norm_y', 'idle_percentage',
+    # Keyboard
+    'alt_key_count', 'tab_key_count', 'control_key_count', 'meta_key_count', 'shift_key_count',
+    'clipboard_operation_rate', 'rapid_key_ratio', 'backspace_ratio',
+    # Window state
+    'total_blur_duration', 'rapid_switch_count', 'tab_switch_count', 'suspicious_resize_count'
+)
+FEATURE_INDEX = {name: index for index, name in enumerate(SCORING_FEATURES)}
 
 def normalize(value: float, min_val: float = 0.0, max_val: float = 1.0) -> float:
     """Normalize a value to be between 0 and 1"""
@@ -10,41 +21,94 @@ def normalize(value: float, min_val: float = 0.0, max_val: float = 1.0) -> float
         return 1.0000
     return round((value - min_val) / (max_val - min_val), 4)
 
-def calculate_mouse_score(features: Dict[str, float]) -> float:
-    """
-    Calculate mouse behavior risk score (0-100)
-    Higher score indicates more suspicious behavior
-    
-    Edge time is the primary indicator:
-    - Any edge time over 1s is highly suspicious
-    - Other factors matter much less
-    """
+def _saturate(values, max_val: float):
+    """normalize() with min_val=0 for a scalar or an array (NaN stays NaN)"""
+    return np.clip(values / max_val, 0.0, 1.0)
+
+def _cap_score(score):
+    """min(100, score) for a scalar or an array; like the builtin, a NaN score caps at 100"""
+    return np.fmin(100.0, score)
+
+# The category scores below take scalars or equal-length arrays, so the online scorer
+# (one window) and the offline batch scorer (every window) share the same weights
+
+def _mouse_score(top_edge_time, bottom_edge_time, std_norm_x, std_norm_y, idle_percentage):
     # Edge time is most suspicious - treat it very strictly
-    edge_time = features['top_edge_time'] + features['bottom_edge_time']
-    edge_score = 1.0000 if edge_time > 1.0 else round(edge_time, 4)  # Binary threshold at 1 second
+    edge_time = top_edge_time + bottom_edge_time
+    edge_score = np.where(edge_time > 1.0, 1.0000, edge_time)  # Binary threshold at 1 second
     
     # Movement variance and idle time are secondary factors
-    movement_variance = normalize(
-        features['std_norm_x'] + features['std_norm_y'],
-        min_val=0,
-        max_val=1.0
-    )
-    
-    idle_time = normalize(
-        features['idle_percentage'],
-        min_val=0,
-        max_val=100
-    )
+    movement_variance = _saturate(std_norm_x + std_norm_y, 1.0)
+    idle_time = _saturate(idle_percentage, 100)
     
     # Calculate weighted score with dominant edge time weight
-    score = round(
+    score = (
         70 * edge_score +          # Edge time is the primary factor
         20 * movement_variance +    # Movement patterns less important
-        10 * idle_time,            # Idle time least important
-        4
+        10 * idle_time             # Idle time least important
+    )
+    
+    return _cap_score(score)
+
+def _keyboard_score(suspicious_keys, clipboard_operation_rate, rapid_key_ratio, backspace_ratio):
+    shortcut_score = _saturate(suspicious_keys, 5)  # 5 or more suspicious keys in a window is maximum score
+    
+    # Other keyboard metrics
+    clipboard_rate = _saturate(clipboard_operation_rate, 5)  # Lowered threshold - 5 operations per minute is suspicious
+    rapid_typing = _saturate(rapid_key_ratio, 0.7)
+    backspace_usage = _saturate(backspace_ratio, 0.3)
+    
+    # Calculate weighted score with emphasis on shortcuts and clipboard
+    score = (
+        40 * shortcut_score +     # Suspicious key combinations most important
+        35 * clipboard_rate +      # Clipboard operations very suspicious
+        15 * rapid_typing +       # Rapid typing less important
+        10 * backspace_usage      # Backspace least important
+    )
+    
+    return _cap_score(score)
+
+def _window_score(total_blur_duration, rapid_switch_count, tab_switch_count, suspicious_resize_count):
+    # Normalize key metrics with stricter thresholds
+    blur_duration = _saturate(total_blur_duration, 10)  # Reduced from 20s to 10s - stricter threshold
+    rapid_switches = _saturate(rapid_switch_count, 3)  # Reduced from 5 to 3 - stricter threshold
+    tab_switches = _saturate(tab_switch_count, 5)  # Reduced from 10 to 5 - stricter threshold
+    suspicious_resizes = _saturate(suspicious_resize_count, 2)  # Reduced from 3 to 2 - stricter threshold
+    
+    # Calculate weighted score with higher emphasis on switches
+    score = (
+        35 * blur_duration +      # Blur duration very important
+        35 * rapid_switches +     # Rapid switches equally important
+        20 * tab_switches +       # Tab switches secondary
+        10 * suspicious_resizes   # Resizes least important
     )
     
-    return min(100.0000, score)
+    return _cap_score(score)
+
+def _total_score(mouse_score, keyboard_score, window_score):
+    # Calculate weighted total with higher weight for keyboard and window behavior
+    return (
+        0.25 * mouse_score +      # Reduced mouse weight
+        0.25 * keyboard_score +   # Increased keyboard weight
+        0.50 * window_score       # Maintained window weight
+    )
+
+def calculate_mouse_score(features: Dict[str, float]) -> float:
+    """
+    Calculate mouse behavior risk score (0-100)
+    Higher score indicates more suspicious behavior
+    
+    Edge time is the primary indicator:
+    - Any edge time over 1s is highly suspicious
+    - Other factors matter much less
+    """
+    return float(_mouse_score(
+        features['top_edge_time'],
+        features['bottom_edge_time'],
+        features['std_norm_x'],
+        features['std_norm_y'],
+        features['idle_percentage']
+    ))
 
 def calculate_keyboard_score(features: Dict[str, float]) -> float:
     """
@@ -61,41 +125,12 @@ def calculate_keyboard_score(features: Dict[str, float]) -> float:
         features.get('shift_key_count', 0)
     )
     
-    shortcut_score = normalize(
+    return float(_keyboard_score(
         suspicious_keys,
-        min_val=0,
-        max_val=5  # 5 or more suspicious keys in a window is maximum score
-    )
-    
-    # Other keyboard metrics
-    clipboard_rate = normalize(
         features['clipboard_operation_rate'],
-        min_val=0,
-        max_val=5  # Lowered threshold - 5 operations per minute is suspicious
-    )
-    
-    rapid_typing = normalize(
         features['rapid_key_ratio'],
-        min_val=0,
-        max_val=0.7
-    )
-    
-    backspace_usage = normalize(
-        features['backspace_ratio'],
-        min_val=0,
-        max_val=0.3
-    )
-    
-    # Calculate weighted score with emphasis on shortcuts and clipboard
-    score = round(
-        40 * shortcut_score +     # Suspicious key combinations most important
-        35 * clipboard_rate +      # Clipboard operations very suspicious
-        15 * rapid_typing +       # Rapid typing less important
-        10 * backspace_usage,     # Backspace least important
-        4
-    )
-    
-    return min(100.0000, score)
+        features['backspace_ratio']
+    ))
 
 def calculate_window_score(features: Dict[str, float]) -> float:
     """
@@ -103,41 +138,59 @@ def calculate_window_score(features: Dict[str, float]) -> float:
     Higher score indicates more suspicious behavior
     Focus on rapid switches and blur duration
     """
-    # Normalize key metrics with stricter thresholds
-    blur_duration = normalize(
+    return float(_window_score(
         features['total_blur_duration'],
-        min_val=0,
-        max_val=10  # Reduced from 20s to 10s - stricter threshold
-    )
-    
-    rapid_switches = normalize(
         features['rapid_switch_count'],
-        min_val=0,
-        max_val=3  # Reduced from 5 to 3 - stricter threshold
-    )
-    
-    tab_switches = normalize(
         features['tab_switch_count'],
-        min_val=0,
-        max_val=5  # Reduced from 10 to 5 - stricter threshold
-    )
+        features['suspicious_resize_count']
+    ))
+
+def score_feature_vector(values: Sequence[float]) -> Tuple[float, float, float, float]:
+    """
+    Score a single window from its features in SCORING_FEATURES order
     
-    suspicious_resizes = normalize(
-        features['suspicious_resize_count'],
-        min_val=0,
-        max_val=2  # Reduced from 3 to 2 - stricter threshold
-    )
+    Returns:
+        Tuple of (total_score, mouse_score, keyboard_score, window_score)
+    """
+    return tuple(float(scores[0]) for scores in score_feature_matrix(
+        np.asarray(values, dtype=np.float64).reshape(1, -1)
+    ))
+
+def score_feature_matrix(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Score many windows at once from a (n_windows, len(SCORING_FEATURES)) array
     
-    # Calculate weighted score with higher emphasis on switches
-    score = round(
-        35 * blur_duration +      # Blur duration very important
-        35 * rapid_switches +     # Rapid switches equally important
-        20 * tab_switches +       # Tab switches secondary
-        10 * suspicious_resizes,  # Resizes least important
-        4
+    Returns:
+        Tuple of (total_scores, mouse_scores, keyboard_scores, window_scores) arrays
+    """
+    def column(name: str) -> np.ndarray:
+        return values[:, FEATURE_INDEX[name]]
+    
+    mouse_scores = _mouse_score(
+        column('top_edge_time'),
+        column('bottom_edge_time'),
+        column('std_norm_x'),
+        column('std_norm_y'),
+        column('idle_percentage')
+    )
+    keyboard_scores = _keyboard_score(
+        column('alt_key_count') +
+        column('tab_key_count') +
+        column('control_key_count') +
+        column('meta_key_count') +
+        column('shift_key_count'),
+        column('clipboard_operation_rate'),
+        column('rapid_key_ratio'),
+        column('backspace_ratio')
+    )
+    window_scores = _window_score(
+        column('total_blur_duration'),
+        column('rapid_switch_count'),
+        column('tab_switch_count'),
+        column('suspicious_resize_count')
     )
     
-    return min(100.0000, score)
+    return _total_score(mouse_scores, keyboard_scores, window_scores), mouse_scores, keyboard_scores, window_scores
 
 def calculate_total_score(features: Dict[str, float]) -> Tuple[float, Dict[str, float]]:
     """
@@ -146,32 +199,30 @@ def calculate_total_score(features: Dict[str, float]) -> Tuple[float, Dict[str,
     Returns:
         Tuple of (total_score, category_scores_dict)
     """
-    # Calculate individual scores
-    mouse_score = calculate_mouse_score(features)
-    keyboard_score = calculate_keyboard_score(features)
-    window_score = calculate_window_score(features)
-    
-    # Calculate weighted total with higher weight for keyboard and window behavior
-    total_score = round(
-        0.25 * mouse_score +      # Reduced mouse weight
-        0.25 * keyboard_score +   # Increased keyboard weight
-        0.50 * window_score,      # Maintained window weight
-        4
+    # Missing features (e.g. key types never pressed) count as zero
+    total_score, mouse_score, keyboard_score, window_score = score_feature_vector(
+        [features.get(name, 0) for name in SCORING_FEATURES]
     )
     
-    # Return scores
-    return total_score, {
+    # Round once, at the boundary
+    return round(total_score, 4), {
         'mouse_score': round(mouse_score, 4),
         'keyboard_score': round(keyboard_score, 4),
         'window_score': round(window_score, 4)
     }
 
+# Inclusive upper score bounds of the low and medium risk levels
+RISK_THRESHOLDS = np.array([25.0, 60.0])
+RISK_LEVELS = np.array(['low', 'medium', 'high'], dtype=object)
+
 def get_risk_level(score: float) -> str:
-    """Convert numerical score to risk level"""
+    """Convert numerical score to risk level (a NaN score is high, as it is within no bound)"""
     score = round(score, 4)
-    if score <= 25.0000:          # Reduced threshold for low risk
-        return 'low'
-    elif score <= 60.0000:        # Reduced threshold for medium risk
-        return 'medium'
-    else:
-        return 'high' 
\ No newline at end of file
+    # Reduced thresholds: low up to 25, medium up to 60
+    return ('low', 'medium', 'high')[2 - int(score <= 25.0000) - int(score <= 60.0000)]
+
+def get_risk_levels(scores: np.ndarray) -> np.ndarray:
+    """Vectorized get_risk_level for an array of scores"""
+    rounded = np.round(np.asarray(scores, dtype=np.float64), 4)
+    # Step down one level per bound the score is within; NaN is within none, like get_risk_level
+    return RISK_LEVELS[2 - (rounded[..., np.newaxis] <= RISK_THRESHOLDS).sum(axis=-1)]
@@ -1,9 +1,18 @@
-import uvicorn
 import pandas as pd
 import numpy as np
-from typing import Dict
+from typing import Dict, Optional
+
+from ..events import event_payload, event_timestamps_ns, select_events
+from ..kernels import blur_durations, count_rapid_gaps, seconds_to_ns
 
 class WindowStateFeatureExtractor:
+    # Names of the features returned by extract_features, in a fixed order
+    FEATURE_NAMES = (
+        'blur_count', 'tab_switch_count', 'window_resize_count', 'rapid_switch_count',
+        'total_blur_duration', 'avg_blur_duration', 'suspicious_resize_count',
+        'tab_switch_frequency', 'window_switch_frequency', 'resize_frequency'
+    )
+
     def __init__(self, window_size: int = 30,
                  rapid_switch_threshold: float = 2.0,  # seconds between switches to be considered rapid
                  suspicious_resize_threshold: float = 0.8):  # ratio threshold for suspicious resizing
@@ -19,7 +28,8 @@ class WindowStateFeatureExtractor:
         self.rapid_switch_threshold = rapid_switch_threshold
         self.suspicious_resize_threshold = suspicious_resize_threshold
     
-    def extract_features(self, events_df: pd.DataFrame) -> Dict[str, float]:
+    def extract_features(self, events_df: pd.DataFrame,
+                         buckets: Optional[Dict[str, pd.DataFrame]] = None) -> Dict[str, float]:
         """
         Extract window state related features from event data.
         
@@ -34,105 +44,75 @@ class WindowStateFeatureExtractor:
         - tab_switch_frequency: Rate of tab switches per minute
         - window_switch_frequency: Rate of window state changes per minute
         - resize_frequency: Rate of window resizes per minute
+        
+        `buckets` optionally holds the window's events already split by type.
         """
+        if len(events_df) == 0:
+            return dict(_ZERO_FEATURES)
+        
         features = {}
-        timestamps = pd.to_datetime(events_df['created_at'])
-        total_time = (timestamps.max() - timestamps.min()).total_seconds() if len(timestamps) > 0 else 0
+        timestamps_ns = event_timestamps_ns(events_df)
+        total_time = (timestamps_ns.max() - timestamps_ns.min()) / 1e9
         
         if total_time == 0:
-            return {
-                'blur_count': 0.0000,
-                'tab_switch_count': 0.0000,
-                'window_resize_count': 0.0000,
-                'rapid_switch_count': 0.0000,
-                'total_blur_duration': 0.0000,
-                'avg_blur_duration': 0.0000,
-                'suspicious_resize_count': 0.0000,
-                'tab_switch_frequency': 0.0000,
-                'window_switch_frequency': 0.0000,
-                'resize_frequency': 0.0000
-            }
+            return dict(_ZERO_FEATURES)
 
+        state_changes = select_events(events_df, 'window_state_change', buckets)
+        tab_switches = select_events(events_df, 'tab_switch', buckets)
+        window_resizes = select_events(events_df, 'window_resize', buckets)
+        
+        # Every feature counts one of these event types, so without them all are zero
+        if len(state_changes) == 0 and len(tab_switches) == 0 and len(window_resizes) == 0:
+            return dict(_ZERO_FEATURES)
+        
         # Process window state changes
-        window_states = events_df[events_df['type'] == 'window_state_change'].copy()
-        if not window_states.empty:
-            window_states['data'] = window_states['data'].apply(lambda x: x if isinstance(x, dict) else {})
-            window_states['state'] = window_states['data'].apply(lambda x: x.get('state', ''))
-            
-            # Count blur events
-            blur_events = window_states[window_states['state'] == 'blurred']
-            focus_events = window_states[window_states['state'] == 'focused']
-            features['blur_count'] = round(float(len(blur_events)), 4)
-            
-            # Calculate blur durations
-            if len(blur_events) > 0 and len(focus_events) > 0:
-                blur_starts = pd.to_datetime(blur_events['created_at'])
-                focus_starts = pd.to_datetime(focus_events['created_at'])
-                
-                # Calculate durations between blur and next focus
-                blur_durations = []
-                for blur_time in blur_starts:
-                    next_focus = focus_starts[focus_starts > blur_time]
-                    if not next_focus.empty:
-                        duration = (next_focus.iloc[0] - blur_time).total_seconds()
-                        blur_durations.append(duration)
-                
-                if blur_durations:
-                    features['total_blur_duration'] = round(float(sum(blur_durations)), 4)
-                    features['avg_blur_duration'] = round(float(np.mean(blur_durations)), 4)
-                else:
-                    features['total_blur_duration'] = 0.0000
-                    features['avg_blur_duration'] = 0.0000
-            else:
-                features['total_blur_duration'] = 0.0000
-                features['avg_blur_duration'] = 0.0000
+        state_change_ns = event_timestamps_ns(state_changes)
+        states = event_payload(state_changes, 'state').to_numpy()
+        blur_ns = np.sort(state_change_ns[states == 'blurred'])
+        focus_ns = np.sort(state_change_ns[states == 'focused'])
+        features['blur_count'] = float(len(blur_ns))
+        
+        # Calculate durations between each blur and the next focus
+        durations = blur_durations(blur_ns, focus_ns)
+        if durations.size:
+            features['total_blur_duration'] = float(durations.sum())
+            features['avg_blur_duration'] = float(durations.mean())
+        else:
+            features['total_blur_duration'] = 0.0000
+            features['avg_blur_duration'] = 0.0000
 
         # Process tab switches
-        tab_switches = events_df[events_df['type'] == 'tab_switch'].copy()
-        features['tab_switch_count'] = round(float(len(tab_switches)), 4)
+        features['tab_switch_count'] = float(len(tab_switches))
         
         # Process window resizes
-        window_resizes = events_df[events_df['type'] == 'window_resize'].copy()
-        features['window_resize_count'] = round(float(len(window_resizes)), 4)
+        features['window_resize_count'] = float(len(window_resizes))
         
-        if not window_resizes.empty:
-            window_resizes['data'] = window_resizes['data'].apply(lambda x: x if isinstance(x, dict) else {})
-            # Calculate suspicious resizes (window becomes too small)
-            def is_suspicious_resize(data):
-                try:
-                    ratio = float(data.get('ratio', 1.0))
-                    return ratio < self.suspicious_resize_threshold
-                except (ValueError, TypeError):
-                    return False
-            
-            suspicious_resizes = window_resizes['data'].apply(is_suspicious_resize)
-            features['suspicious_resize_count'] = round(float(suspicious_resizes.sum()), 4)
+        if len(window_resizes) > 0:
+            # Calculate suspicious resizes (window becomes too small).
+            # A missing ratio means full size; a non-numeric one is never suspicious (NaN).
+            ratios = pd.to_numeric(event_payload(window_resizes, 'ratio').fillna(1.0), errors='coerce')
+            suspicious_resizes = ratios.to_numpy(dtype=np.float64) < self.suspicious_resize_threshold
+            features['suspicious_resize_count'] = float(suspicious_resizes.sum())
         else:
             features['suspicious_resize_count'] = 0.0000
         
         # Calculate rapid switches
-        all_switches = pd.concat([
-            window_states[['created_at']],
-            tab_switches[['created_at']]
-        ]).sort_values('created_at')
-        
-        if len(all_switches) > 1:
-            switch_times = pd.to_datetime(all_switches['created_at'])
-            time_diffs = switch_times.diff().dt.total_seconds()
-            rapid_switches = time_diffs[time_diffs <= self.rapid_switch_threshold]
-            features['rapid_switch_count'] = round(float(len(rapid_switches)), 4)
-        else:
-            features['rapid_switch_count'] = 0.0000
+        switch_ns = np.sort(np.concatenate([state_change_ns, event_timestamps_ns(tab_switches)]))
+        rapid_switches = count_rapid_gaps(switch_ns, seconds_to_ns(self.rapid_switch_threshold))
+        features['rapid_switch_count'] = float(rapid_switches)
         
         # Calculate frequencies (per minute)
         minutes = total_time / 60
         if minutes > 0:
-            features['tab_switch_frequency'] = round(features['tab_switch_count'] / minutes, 4)
-            features['window_switch_frequency'] = round(features['blur_count'] / minutes, 4)
-            features['resize_frequency'] = round(features['window_resize_count'] / minutes, 4)
+            features['tab_switch_frequency'] = features['tab_switch_count'] / minutes
+            features['window_switch_frequency'] = features['blur_count'] / minutes
+            features['resize_frequency'] = features['window_resize_count'] / minutes
         else:
             features['tab_switch_frequency'] = 0.0000
             features['window_switch_frequency'] = 0.0000
             features['resize_frequency'] = 0.0000
         
-        return features 
\ No newline at end of file
+        return features 
+
+# Features of a window without any window state, tab switch or resize events
+_ZERO_FEATURES = dict.fromkeys(WindowStateFeatureExtractor.FEATURE_NAMES, 0.0)
@@ -71,7 +71,7 @@ def process_exam_data(df: pd.DataFrame, window_size: int = 30) -> pd.DataFrame:
     
     # Process each exam separately
     for exam_id in df['exam_id'].unique():
-        exam_data = df[df['exam_id'] == exam_id].copy()
+        exam_data = df[df['exam_id'] == exam_id]
         
         # Process each time window
         start_time = pd.to_datetime(exam_data['created_at'])
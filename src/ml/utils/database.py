@@ -1,18 +1,62 @@
 import os
+import httpx
 from dotenv import load_dotenv
+from functools import lru_cache
+from typing import Any, Tuple
 from supabase import create_client, Client
 
-def get_supabase_client() -> Client:
-    """Initialize and return Supabase client"""
+# Read .env once at import, unless the environment already provides the credentials
+if not os.getenv("SUPABASE_URL"):
     load_dotenv()
-    
+
+def get_supabase_credentials() -> Tuple[str, str]:
+    """Return the Supabase URL and key from the environment"""
     supabase_url = os.getenv("SUPABASE_URL")
     supabase_key = os.getenv("SUPABASE_KEY")
     
     if not supabase_url or not supabase_key:
         raise ValueError("Missing SUPABASE_URL or SUPABASE_KEY in environment variables")
     
-    return create_client(supabase_url, supabase_key)
+    return supabase_url, supabase_key
+
+@lru_cache(maxsize=1)
+def get_supabase_client() -> Client:
+    """Initialize the Supabase client once and return the shared instance"""
+    return create_client(*get_supabase_credentials())
+
+# Bulk updates can run long; match the timeout of the synchronous postgrest client
+REST_TIMEOUT_SECONDS = 120.0
+
+def create_async_rest_client() -> httpx.AsyncClient:
+    """Create the async HTTP client for the Supabase REST API
+    
+    The caller owns the client and must close it with aclose(); the API opens one
+    per application lifespan so it stays on the serving event loop.
+    """
+    return httpx.AsyncClient(timeout=httpx.Timeout(REST_TIMEOUT_SECONDS))
+
+async def call_rpc_async(client: httpx.AsyncClient, function: str, params: dict) -> Any:
+    """Call a Postgres function through the REST API without blocking the event loop
+    
+    Args:
+        client: Client from create_async_rest_client
+        function: Name of the database function
+        params: Named arguments of the function
+    
+    Returns:
+        Decoded JSON result, or None for functions returning void
+    """
+    supabase_url, supabase_key = get_supabase_credentials()
+    response = await client.post(
+        f"{supabase_url.rstrip('/')}/rest/v1/rpc/{function}",
+        json=params,
+        headers={
+            'apikey': supabase_key,
+            'Authorization': f"Bearer {supabase_key}"
+        }
+    )
+    response.raise_for_status()
+    return response.json() if response.content else None
 
 def fetch_exam_events(exam_id: str = None) -> list:
     """Fetch events from the database
@@ -31,4 +75,32 @@ def fetch_exam_events(exam_id: str = None) -> list:
     
     response = query.execute()
     print(response)
-    return response.data 
\ No newline at end of file
+    return response.data 
+
+def fetch_exam_events_paged(exam_id: str = None, page_size: int = 1000) -> list:
+    """Fetch all events from the database, one page at a time
+    
+    Args:
+        exam_id: Optional exam_id to filter by
+        page_size: Rows requested per page (PostgREST returns at most 1000 rows per request by default)
+    
+    Returns:
+        List of events
+    """
+    client = get_supabase_client()
+    events = []
+    
+    while True:
+        query = client.table('proctoring_logs').select('*')
+        if exam_id:
+            query = query.eq('exam_id', exam_id)
+        
+        # The server may cap a page below page_size (max-rows), so continue from the rows
+        # actually received and stop only on an empty page
+        offset = len(events)
+        rows = query.order('id').range(offset, offset + page_size - 1).execute().data
+        if not rows:
+            break
+        events.extend(rows)
+    
+    return events
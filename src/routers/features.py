@@ -1,21 +1,25 @@
 from fastapi import APIRouter, HTTPException
 from typing import Dict, List, Optional
-from datetime import datetime, timedelta
-import pandas as pd
+from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel
-import pytz
 import uuid
 
 from src.ml.utils.database import get_supabase_client
 from src.ml.features.mouse_features.extractor import MouseFeatureExtractor
 from src.ml.features.keyboard_features.extractor import KeyboardFeatureExtractor
 from src.ml.features.window_features.extractor import WindowStateFeatureExtractor
+from src.ml.features.events import EVENT_COLUMNS, bucket_events, ingest_events
 
 router = APIRouter(
     prefix="/features",
     tags=["features"]
 )
 
+# Extractors hold only configuration, so one instance serves every request
+_mouse_extractor = MouseFeatureExtractor()
+_keyboard_extractor = KeyboardFeatureExtractor()
+_window_extractor = WindowStateFeatureExtractor()
+
 class FeaturesRequest(BaseModel):
     test_id: uuid.UUID
     interval_seconds: int = 300  # Default 5 minutes in seconds
@@ -54,12 +58,12 @@ async def extract_features(request: FeaturesRequest):
         used_fallback = False
         
         # First try getting events from the specified time window
-        current_time = datetime.now(pytz.UTC)
+        current_time = datetime.now(timezone.utc)
         window_start = current_time - timedelta(seconds=request.interval_seconds)
         
         # Get events for the time window
         response = supabase.table('proctoring_logs')\
-            .select('*')\
+            .select(','.join(EVENT_COLUMNS))\
             .eq('test_id', request.test_id)\
             .gte('created_at', window_start.isoformat())\
             .lte('created_at', current_time.isoformat())\
@@ -70,7 +74,7 @@ async def extract_features(request: FeaturesRequest):
         if not response.data:
             used_fallback = True
             response = supabase.table('proctoring_logs')\
-                .select('*')\
+                .select(','.join(EVENT_COLUMNS))\
                 .eq('test_id', request.test_id)\
                 .order('created_at', desc=True)\
                 .limit(request.fallback_limit)\
@@ -79,32 +83,27 @@ async def extract_features(request: FeaturesRequest):
             if not response.data:
                 raise HTTPException(status_code=404, detail="No events found for this exam")
         
-        # Convert to DataFrame and ensure UTC timezone
-        events = pd.DataFrame(response.data)
-        events['created_at'] = pd.to_datetime(events['created_at']).dt.tz_convert('UTC')
+        # Convert to a time-ordered UTC DataFrame (the fallback query is newest first)
+        events = ingest_events(response.data)
         
         if used_fallback:
             # For fallback data, use the actual time range from the events
             window_start = events['created_at'].min()
             current_time = events['created_at'].max()
         
-        # Initialize feature extractors
-        mouse_extractor = MouseFeatureExtractor()
-        keyboard_extractor = KeyboardFeatureExtractor()
-        window_extractor = WindowStateFeatureExtractor()
-        
-        # Extract features for the interval
-        mouse_features = mouse_extractor.extract_features(events)
-        keyboard_features = keyboard_extractor.extract_features(events)
-        window_features = window_extractor.extract_features(events)
+        # Extract features for the interval, splitting it by event type once for all extractors
+        buckets = bucket_events(events)
+        mouse_features = _mouse_extractor.extract_features(events, buckets)
+        keyboard_features = _keyboard_extractor.extract_features(events, buckets)
+        window_features = _window_extractor.extract_features(events, buckets)
         
-        # Create response
+        # Create response (extractors return full precision, round for display)
         interval_features = IntervalFeatures(
             interval_start=window_start,
             interval_end=current_time,
-            mouse_features=mouse_features,
-            keyboard_features=keyboard_features,
-            window_features=window_features,
+            mouse_features={name: round(value, 4) for name, value in mouse_features.items()},
+            keyboard_features={name: round(value, 4) for name, value in keyboard_features.items()},
+            window_features={name: round(value, 4) for name, value in window_features.items()},
             event_count=len(events)
         )
         
@@ -1,23 +1,29 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from typing import Dict, List
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import numpy as np
 import pandas as pd
 from pydantic import BaseModel
-import pytz
 import uuid
-from src.ml.utils.database import get_supabase_client
+from src.ml.utils.database import call_rpc_async, get_supabase_client
 from src.ml.features.mouse_features.extractor import MouseFeatureExtractor
 from src.ml.features.keyboard_features.extractor import KeyboardFeatureExtractor
 from src.ml.features.window_features.extractor import WindowStateFeatureExtractor
 from src.ml.features.scoring import calculate_total_score, get_risk_level
+from src.ml.features.events import EVENT_COLUMNS, bucket_events, event_timestamps_ns, ingest_events
 
 router = APIRouter(
     prefix="/scoring",
 )
 
+# Extractors hold only configuration, so one instance serves every request
+_mouse_extractor = MouseFeatureExtractor()
+_keyboard_extractor = KeyboardFeatureExtractor()
+_window_extractor = WindowStateFeatureExtractor()
+
 def get_utc_now() -> datetime:
     """Get current UTC time with timezone info"""
-    return datetime.now(pytz.UTC)
+    return datetime.now(timezone.utc)
 
 # Request Models
 class RiskScoreRequest(BaseModel):
@@ -40,15 +46,15 @@ class RiskScoreResponse(BaseModel):
     risk_scores: List[RiskScore]
 
 def extract_features_for_interval(events_df: pd.DataFrame, start_time: datetime, end_time: datetime) -> Dict:
-    """Extract features for a specific time interval"""
-    # Convert datetime to UTC timestamp for comparison
-    start_ts = pd.Timestamp(start_time).tz_convert('UTC')
-    end_ts = pd.Timestamp(end_time).tz_convert('UTC')
+    """Extract features for a specific time interval (events_df must be sorted by created_at)"""
+    # Compare as integer nanoseconds since the epoch (UTC)
+    start_ns = pd.Timestamp(start_time).value
+    end_ns = pd.Timestamp(end_time).value
     
-    interval_events = events_df[
-        (events_df['created_at'] >= start_ts) & 
-        (events_df['created_at'] < end_ts)
-    ]
+    # Events are sorted, so the interval is the contiguous run found by binary search
+    timestamps_ns = event_timestamps_ns(events_df)
+    first, end = np.searchsorted(timestamps_ns, [start_ns, end_ns], side='left')
+    interval_events = events_df.iloc[first:end]
     
     # If no events in interval, return default features
     if len(interval_events) == 0:
@@ -77,15 +83,11 @@ def extract_features_for_interval(events_df: pd.DataFrame, start_time: datetime,
             'suspicious_resize_count': 0
         }
     
-    # Initialize feature extractors
-    mouse_extractor = MouseFeatureExtractor()
-    keyboard_extractor = KeyboardFeatureExtractor()
-    window_extractor = WindowStateFeatureExtractor()
-    
-    # Extract features
-    mouse_features = mouse_extractor.extract_features(interval_events)
-    keyboard_features = keyboard_extractor.extract_features(interval_events)
-    window_features = window_extractor.extract_features(interval_events)
+    # Extract features, splitting the interval by event type once for all extractors
+    buckets = bucket_events(interval_events)
+    mouse_features = _mouse_extractor.extract_features(interval_events, buckets)
+    keyboard_features = _keyboard_extractor.extract_features(interval_events, buckets)
+    window_features = _window_extractor.extract_features(interval_events, buckets)
     
     # Combine all features
     features = {**mouse_features, **keyboard_features, **window_features}
@@ -124,12 +126,13 @@ def extract_features_for_interval(events_df: pd.DataFrame, start_time: datetime,
     return features
 
 @router.post("/calculate", response_model=RiskScoreResponse)
-async def calculate_risk_scores(request: RiskScoreRequest):
+async def calculate_risk_scores(request: RiskScoreRequest, http_request: Request):
     """
     Calculate risk scores for an exam using a rolling window
     
     Args:
         request: RiskScoreRequest containing test_id, interval_seconds, and window_size_seconds
+        http_request: Incoming request, used for the shared REST client on app.state
     """
     try:
         # Get Supabase client
@@ -141,7 +144,7 @@ async def calculate_risk_scores(request: RiskScoreRequest):
         
         # Get events only for the rolling window
         response = supabase.table('proctoring_logs')\
-            .select('*')\
+            .select(','.join(EVENT_COLUMNS))\
             .eq('test_id', request.test_id)\
             .gte('created_at', window_start.isoformat())\
             .lte('created_at', current_time.isoformat())\
@@ -151,12 +154,12 @@ async def calculate_risk_scores(request: RiskScoreRequest):
         if not response.data:
             raise HTTPException(status_code=404, detail="No events found in the specified time window")
         
-        # Convert to DataFrame and ensure UTC timezone
-        events = pd.DataFrame(response.data)
-        events['created_at'] = pd.to_datetime(events['created_at']).dt.tz_convert('UTC')
+        # Convert to a time-ordered UTC DataFrame; the interval filter slices on its _ts_ns column
+        events = ingest_events(response.data)
         
         # Process intervals within the window
         updates = []
+        interval_updates = []
         interval_start = window_start
         
         while interval_start < current_time:
@@ -170,26 +173,16 @@ async def calculate_risk_scores(request: RiskScoreRequest):
                 total_score, category_scores = calculate_total_score(features)
                 risk_level = get_risk_level(total_score)
                 
-                # Update records in this interval
-                update_data = {
+                # Queue the update for records in this interval (timestamps as ISO strings for Supabase)
+                interval_updates.append({
+                    'interval_start': interval_start.isoformat(),
+                    'interval_end': interval_end.isoformat(),
                     'risk_score': total_score,
                     'risk_level': risk_level,
                     'mouse_score': category_scores['mouse_score'],
                     'keyboard_score': category_scores['keyboard_score'],
                     'window_score': category_scores['window_score']
-                }
-                
-                # Convert timestamps to ISO format strings for Supabase
-                start_iso = interval_start.isoformat()
-                end_iso = interval_end.isoformat()
-                
-                # Update all records in the interval
-                supabase.table('proctoring_logs')\
-                    .update(update_data)\
-                    .gte('created_at', start_iso)\
-                    .lt('created_at', end_iso)\
-                    .eq('test_id', request.test_id)\
-                    .execute()
+                })
                 
                 updates.append(RiskScore(
                     interval_start=interval_start,
@@ -207,6 +200,13 @@ async def calculate_risk_scores(request: RiskScoreRequest):
         if not updates:
             raise HTTPException(status_code=500, detail="Failed to process any intervals successfully")
         
+        # Update the records of every interval in a single round-trip without blocking the
+        # event loop (see supabase/migrations for bulk_update_scores)
+        await call_rpc_async(http_request.app.state.rest_client, 'bulk_update_scores', {
+            'p_test_id': str(request.test_id),
+            'p_intervals': interval_updates
+        })
+        
         return RiskScoreResponse(
             test_id=request.test_id,
             intervals_processed=len(updates),
@@ -235,19 +235,15 @@ async def get_exam_risk_summary(test_id: uuid.UUID):
         # Convert to DataFrame for easier aggregation
         df = pd.DataFrame(response.data)
         
-        # Calculate summary statistics
-        summary = []
-        for level in df['risk_level'].unique():
-            level_data = df[df['risk_level'] == level]
-            summary.append({
-                'risk_level': level,
-                'interval_count': len(level_data),
-                'avg_risk_score': round(level_data['risk_score'].mean(), 4),
-                'max_risk_score': round(level_data['risk_score'].max(), 4),
-                'avg_mouse_score': round(level_data['mouse_score'].mean(), 4),
-                'avg_keyboard_score': round(level_data['keyboard_score'].mean(), 4),
-                'avg_window_score': round(level_data['window_score'].mean(), 4)
-            })
+        # Calculate summary statistics for every risk level in one pass
+        summary = df.groupby('risk_level', sort=False).agg(
+            interval_count=('risk_score', 'size'),
+            avg_risk_score=('risk_score', 'mean'),
+            max_risk_score=('risk_score', 'max'),
+            avg_mouse_score=('mouse_score', 'mean'),
+            avg_keyboard_score=('keyboard_score', 'mean'),
+            avg_window_score=('window_score', 'mean')
+        ).round(4).reset_index().to_dict('records')
         
         return {
             'test_id': test_id,
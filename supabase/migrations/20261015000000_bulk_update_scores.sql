@@ -0,0 +1,27 @@
+-- Apply the risk scores of many intervals to proctoring_logs in one statement.
+-- p_intervals is a JSON array of
+--   {interval_start, interval_end, risk_score, risk_level, mouse_score, keyboard_score, window_score}
+-- and every log of the test with interval_start <= created_at < interval_end gets that interval's scores.
+create or replace function bulk_update_scores(p_test_id uuid, p_intervals jsonb)
+returns void
+language sql
+as $$
+    update proctoring_logs as logs
+    set risk_score = intervals.risk_score,
+        risk_level = intervals.risk_level,
+        mouse_score = intervals.mouse_score,
+        keyboard_score = intervals.keyboard_score,
+        window_score = intervals.window_score
+    from jsonb_to_recordset(p_intervals) as intervals(
+        interval_start timestamptz,
+        interval_end timestamptz,
+        risk_score double precision,
+        risk_level text,
+        mouse_score double precision,
+        keyboard_score double precision,
+        window_score double precision
+    )
+    where logs.test_id = p_test_id
+      and logs.created_at >= intervals.interval_start
+      and logs.created_at < intervals.interval_end;
+$$;
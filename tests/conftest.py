@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+# The offline scripts in src/ml run from src/ and import through the ml and features roots
+SRC = Path(__file__).resolve().parent.parent / 'src'
+for path in (SRC, SRC / 'ml'):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
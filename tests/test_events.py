@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from src.ml.features.events import bucket_events, event_payload, ingest_events
+
+def make_row(created_at, event_type, data):
+    return {
+        'created_at': created_at,
+        'type': event_type,
+        'data': data,
+        'window_width': 1000,
+        'window_height': 800
+    }
+
+def test_ingest_events_with_mixed_payload_value_types():
+    # `selection` is logged both as a number and as text, which Arrow cannot put in one struct
+    rows = [
+        make_row('2026-01-01T09:00:05+00:00', 'clipboard', {'action': 'copy', 'selection': 42}),
+        make_row('2026-01-01T09:00:00+00:00', 'clipboard', {'action': 'paste', 'selection': 'abc'}),
+        make_row('2026-01-01T09:00:02+00:00', 'key_press', {'key_type': 'Tab'})
+    ]
+    events = ingest_events(rows)
+    
+    assert 'data' not in events.columns
+    assert str(events['created_at'].dt.tz) == 'UTC'
+    assert events['type'].dtype == 'category'
+    # Sorted by time, with every payload value kept as logged
+    assert events['type'].tolist() == ['clipboard', 'key_press', 'clipboard']
+    assert event_payload(events, 'action').tolist()[::2] == ['paste', 'copy']
+    selections = event_payload(events, 'selection').tolist()
+    assert selections[0] == 'abc' and pd.isna(selections[1]) and selections[2] == 42
+    assert event_payload(events, 'missing').isna().all()
+    expected_ns = pd.to_datetime(['2026-01-01T09:00:00Z', '2026-01-01T09:00:02Z', '2026-01-01T09:00:05Z'])
+    np.testing.assert_array_equal(events['_ts_ns'].to_numpy(), expected_ns.as_unit('ns').asi8)
+    
+    buckets = bucket_events(events)
+    assert {event_type: len(bucket) for event_type, bucket in buckets.items()} == {'clipboard': 2, 'key_press': 1}
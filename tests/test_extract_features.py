@@ -0,0 +1,72 @@
+import importlib
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+EXAM_START = datetime(2026, 1, 1, 9, 0, tzinfo=timezone.utc)
+
+@pytest.fixture
+def extract_features(tmp_path, monkeypatch):
+    pytest.importorskip('supabase')
+    pytest.importorskip('dotenv')
+    # Importing the script creates its output directories relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module('extract_features')
+
+def make_event(exam_id, seconds, event_type='mouse_move', **data):
+    return {
+        'exam_id': exam_id,
+        'created_at': (EXAM_START + timedelta(seconds=seconds)).isoformat(),
+        'type': event_type,
+        'data': data or {'x': 100, 'y': 100},
+        'window_width': 1000,
+        'window_height': 800
+    }
+
+def window_starts(features_df, exam_id):
+    starts = features_df.loc[features_df['exam_id'] == exam_id, 'window_start']
+    return [(start - pd.Timestamp(EXAM_START)).total_seconds() for start in starts]
+
+def test_windows_start_before_the_last_event(extract_features):
+    events = [
+        make_event('solo', 0),
+        make_event('same_time', 5), make_event('same_time', 5),
+        make_event('on_boundary', 0), make_event('on_boundary', 30),
+        make_event('past_boundary', 0), make_event('past_boundary', 10), make_event('past_boundary', 45)
+    ]
+    features_df = extract_features.process_exam_data(events, window_size=30, n_jobs=1)
+    
+    # Exams whose events all share one timestamp produce no window at all
+    assert set(features_df['exam_id']) == {'on_boundary', 'past_boundary'}
+    # An event exactly on the boundary at the exam end does not open a window of its own
+    assert window_starts(features_df, 'on_boundary') == [0.0]
+    assert window_starts(features_df, 'past_boundary') == [0.0, 30.0]
+
+def test_window_features_count_each_event_type_per_window(extract_features):
+    events = [
+        make_event('exam', 0),
+        make_event('exam', 1, 'key_press', key_type='a'),
+        make_event('exam', 2, 'key_press', key_type='b'),
+        make_event('exam', 3, 'key_press', key_type='Tab'),
+        make_event('exam', 4, 'clipboard', action='copy', selection='abc'),
+        make_event('exam', 5, 'window_state_change', state='blurred'),
+        make_event('exam', 8, 'window_state_change', state='focused'),
+        make_event('exam', 9, 'tab_switch', url='x'),
+        # Windows are half-open, so an event exactly on a boundary opens the next window
+        make_event('exam', 30, 'key_press', key_type='a'),
+        make_event('exam', 31, 'key_press', key_type='b'),
+        make_event('exam', 32, 'clipboard', action='paste', selection='abc'),
+        make_event('exam', 33, 'clipboard', action='cut', selection='abc'),
+        make_event('exam', 40, 'window_state_change', state='blurred'),
+        make_event('exam', 45)
+    ]
+    features_df = extract_features.process_exam_data(events, window_size=30, n_jobs=1)
+    
+    assert window_starts(features_df, 'exam') == [0.0, 30.0]
+    assert features_df['key_press_count'].tolist() == [3.0, 2.0]
+    assert features_df['clipboard_operation_count'].tolist() == [1.0, 2.0]
+    assert features_df['blur_count'].tolist() == [1.0, 1.0]
+    assert features_df['tab_switch_count'].tolist() == [1.0, 0.0]
+    # The second blur has no later focus, so only the first one has a duration
+    assert features_df['total_blur_duration'].tolist() == [3.0, 0.0]
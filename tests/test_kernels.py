@@ -0,0 +1,26 @@
+import numpy as np
+
+from src.ml.features.kernels import blur_durations, count_rapid_gaps, seconds_to_ns
+
+def test_seconds_to_ns_rounds_to_whole_nanoseconds():
+    assert seconds_to_ns(0.1) == 100_000_000
+    assert seconds_to_ns(2) == 2_000_000_000
+
+def test_blur_pairs_with_first_focus_strictly_after_it():
+    blur_ns = np.array([10, 20, 45, 90], dtype=np.int64)
+    focus_ns = np.array([20, 30, 60], dtype=np.int64)
+    # The focus at 20 ends the blur at 10 but not the one at 20, which lasts until 30;
+    # the blur at 90 has no later focus and is dropped
+    np.testing.assert_array_equal(blur_durations(blur_ns, focus_ns), [10e-9, 10e-9, 15e-9])
+
+def test_blur_durations_without_blurs_or_focuses():
+    events_ns = np.array([10, 20], dtype=np.int64)
+    empty_ns = np.empty(0, dtype=np.int64)
+    assert blur_durations(empty_ns, events_ns).size == 0
+    assert blur_durations(events_ns, empty_ns).size == 0
+
+def test_rapid_gaps_include_the_threshold():
+    threshold_ns = seconds_to_ns(0.1)
+    sorted_ns = np.cumsum([0, threshold_ns, threshold_ns + 1, threshold_ns - 1, 5 * threshold_ns])
+    assert count_rapid_gaps(sorted_ns, threshold_ns) == 2
+    assert count_rapid_gaps(sorted_ns[:1], threshold_ns) == 0
@@ -0,0 +1,37 @@
+import numpy as np
+
+from src.ml.features.scoring import (
+    SCORING_FEATURES,
+    calculate_total_score,
+    get_risk_level,
+    get_risk_levels,
+    score_feature_matrix,
+    score_feature_vector,
+)
+
+def test_risk_levels_match_scalar_thresholds():
+    scores = np.array([0.0, 25.0, 25.00004, 25.0001, 60.0, 60.0001, 100.0])
+    expected = ['low', 'low', 'low', 'medium', 'medium', 'high', 'high']
+    assert [get_risk_level(score) for score in scores] == expected
+    assert get_risk_levels(scores).tolist() == expected
+
+def test_nan_score_is_high_in_both_versions():
+    # NaN fails both inclusive bounds, so it falls through to high as in the original branches
+    assert get_risk_level(float('nan')) == 'high'
+    assert get_risk_level(np.nan) == 'high'
+    assert get_risk_levels(np.array([np.nan, 10.0, 70.0])).tolist() == ['high', 'low', 'high']
+
+def test_vector_and_matrix_scores_agree_with_nan_features():
+    rng = np.random.default_rng(0)
+    values = rng.uniform(-1.0, 12.0, size=(200, len(SCORING_FEATURES)))
+    values[rng.random(values.shape) < 0.1] = np.nan
+    matrix_scores = np.column_stack(score_feature_matrix(values))
+    vector_scores = np.array([score_feature_vector(row) for row in values])
+    np.testing.assert_array_equal(vector_scores, matrix_scores)
+
+def test_nan_feature_caps_its_category_score():
+    features = dict.fromkeys(SCORING_FEATURES, 0.0)
+    features['std_norm_x'] = np.nan
+    total_score, category_scores = calculate_total_score(features)
+    assert category_scores == {'mouse_score': 100.0, 'keyboard_score': 0.0, 'window_score': 0.0}
+    assert total_score == 25.0